@@ -0,0 +1,121 @@
+import os
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import DeclarativeBase
+from dotenv import load_dotenv
+load_dotenv()
+
+
+# Prefer the C-accelerated mysqlclient driver, fall back to pure-Python pymysql.
+# mysqlclient is optional: it builds from source against the libmysqlclient headers
+# and pkg-config, so `pip install mysqlclient` only where those are installed.
+try:
+    from MySQLdb import DatabaseError
+    from MySQLdb.cursors import DictCursor, SSCursor
+    MYSQL_DRIVER = "mysqldb"
+except ImportError:
+    from pymysql import DatabaseError
+    from pymysql.cursors import DictCursor, SSCursor
+    MYSQL_DRIVER = "pymysql"
+
+if not os.getenv("DATABASE_URL"):
+    raise RuntimeError("DATABASE_URL is not set")
+
+# Parse once; Railway hands out plain mysql:// URLs and SQLAlchemy needs an explicit driver
+DATABASE_URL = make_url(os.environ["DATABASE_URL"])
+if DATABASE_URL.drivername == "mysql":
+    DATABASE_URL = DATABASE_URL.set(drivername=f"mysql+{MYSQL_DRIVER}")
+
+# Connection pool sizing. Every worker runs both a write pool (DB_POOL_SIZE,
+# DB_MAX_OVERFLOW) and a read pool (DB_RO_POOL_SIZE, DB_RO_MAX_OVERFLOW), so keep
+# workers x DB_MAX_CONNECTIONS under MySQL's max_connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_RO_POOL_SIZE = int(os.getenv("DB_RO_POOL_SIZE", "20"))
+DB_RO_MAX_OVERFLOW = int(os.getenv("DB_RO_MAX_OVERFLOW", "10"))
+DB_MAX_CONNECTIONS = DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_RO_POOL_SIZE + DB_RO_MAX_OVERFLOW
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Probe connections on checkout so MySQL's idle disconnects don't fail requests.
+# Turn off behind PgBouncer-style transaction pooling (use a short pool_recycle instead).
+DB_PRE_PING = os.getenv("DB_PRE_PING", "1") == "1"
+
+# Replace pooled connections before MySQL's wait_timeout drops them. This is only
+# checked at checkout; a connection held across the boundary is not affected.
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# Session settings ride along with the connection handshake instead of costing
+# an extra round-trip per new (or recycled) connection
+DB_CONNECT_ARGS = {
+    "charset": "utf8mb4",
+    "init_command": "SET time_zone = '+00:00', SESSION transaction_isolation = 'READ-COMMITTED'",
+}
+
+ENGINE_OPTIONS = dict(
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=DB_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_use_lifo=True,  # reuse the hottest connection, let idle ones age out
+    # Only create_all compiles through SQLAlchemy; the raw_connection() cursors behind
+    # every endpoint send their SQL text straight to the driver and never touch this cache
+    query_cache_size=1200,
+    connect_args=DB_CONNECT_ARGS,
+    echo=os.getenv("SQL_ECHO", "0") == "1",  # SQL logging is debug-only
+)
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    **ENGINE_OPTIONS,
+)
+
+# Read-only paths run in autocommit, so there is nothing to roll back when a
+# connection goes back to the pool; skip that round-trip
+ro_engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_RO_POOL_SIZE,
+    max_overflow=DB_RO_MAX_OVERFLOW,
+    pool_reset_on_return=None,
+    isolation_level="AUTOCOMMIT",
+    **ENGINE_OPTIONS,
+)
+
+
+class Base(DeclarativeBase):
+    """Single declarative base, so every model shares one MetaData registry"""
+    pass
+
+
+def dispose_for_worker():
+    """Drop pooled connections inherited from a forking parent process"""
+    # close=False leaves the parent's sockets alone; this process just opens its own
+    engine.dispose(close=False)
+    ro_engine.dispose(close=False)
+
+
+def close_engines():
+    """Close every pooled connection, for a clean shutdown"""
+    engine.dispose()
+    ro_engine.dispose()
+
+
+@contextmanager
+def get_connection(read_only=False):
+    """Check out a raw DB-API connection from the pool (DictCursor for dict rows, SSCursor to stream)"""
+    conn = (ro_engine if read_only else engine).raw_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()  # returns the connection to the pool
+
+
+def warmup():
+    """Open pool_size connections up front so first requests skip the handshake"""
+    # The read pool carries token checks and every GET, so it is warmed too
+    for pool_engine in (engine, ro_engine):
+        conns = [pool_engine.connect() for _ in range(pool_engine.pool.size())]
+        for conn in conns:
+            conn.close()
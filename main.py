@@ -1,37 +1,103 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Dict, Any
-from datetime import datetime, date, timedelta
+from pathlib import Path
+from datetime import datetime, date, timedelta, timezone
 from fastapi.staticfiles import StaticFiles
 
 
+import asyncio
+from contextlib import ExitStack, asynccontextmanager
+from anyio import CancelScope, to_thread
 import hashlib
+import hmac
+import itertools
 import jwt
 import os
-from contextlib import contextmanager
-import json
+import threading
+import time
+import orjson
 import re
 from fastapi import status
 from pydantic import validator
+from prometheus_client import CONTENT_TYPE_LATEST, Gauge, generate_latest
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError, InvalidHashError
+from cachetools import TTLCache
 
-from sqlalchemy.orm import Session
-from db import get_db
-from db import Base, engine
+from db import Base, engine, ro_engine, DatabaseError, DictCursor, SSCursor, DB_MAX_CONNECTIONS, get_connection, dispose_for_worker, close_engines, warmup
 from dotenv import load_dotenv
 load_dotenv()
 
 
 # Initialize FastAPI app
-app = FastAPI(title="Daily Tracker API", version="1.0.0")
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+app = FastAPI(title="Daily Tracker API", version="1.0.0", default_response_class=ORJSONResponse)
+
+# An exact route rather than a Mount: a mounted app only matches "/metrics/", and the
+# catch-all static mount at "/" would answer the bare path with a 404
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 # Security
 security = HTTPBearer()
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 
+# Verified tokens -> (user_id, exp). The TTL also bounds how long a deactivated
+# account keeps working with an already-verified token.
+TOKEN_CACHE_TTL = int(os.getenv("TOKEN_CACHE_TTL", "10"))
+token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+token_cache_lock = threading.Lock()
+
+# Encoded /summary and /trends payloads per user: user_id -> {key: bytes}. Writes
+# drop the user's entry; the TTL bounds staleness across workers, which don't see
+# each other's invalidations.
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "60"))
+response_cache = TTLCache(maxsize=10_000, ttl=RESPONSE_CACHE_TTL)
+response_cache_lock = threading.Lock()
+
+# user_id -> generation, bounded like the cache it guards. Values come from one
+# process-wide counter, so a generation never repeats: a read that raced a write,
+# or whose entry expired meanwhile, sees a different value at store time and skips
+# caching what may be a stale result.
+response_generations = TTLCache(maxsize=10_000, ttl=RESPONSE_CACHE_TTL)
+generation_counter = itertools.count(1)
+
+def encode_response(result) -> bytes:
+    """Encode a route result exactly as FastAPI's default ORJSONResponse would"""
+    return orjson.dumps(jsonable_encoder(result))
+
+def get_cached_response(user_id: int, key):
+    """Return (cached payload or None, generation to pass to set_cached_response)"""
+    with response_cache_lock:
+        generation = response_generations.get(user_id)
+        if generation is None:
+            generation = response_generations[user_id] = next(generation_counter)
+        return response_cache.get(user_id, {}).get(key), generation
+
+def set_cached_response(user_id: int, key, value, generation: int):
+    """Cache an encoded payload until the user's next write or the TTL"""
+    with response_cache_lock:
+        if response_generations.get(user_id) != generation:
+            return  # a write committed while this result was being computed
+        entries = response_cache.get(user_id)
+        if entries is None:
+            entries = response_cache[user_id] = {}
+        entries[key] = value
+
+def invalidate_user_cache(user_id: int):
+    """Forget every cached payload for a user after their activities change"""
+    with response_cache_lock:
+        response_generations[user_id] = next(generation_counter)
+        response_cache.pop(user_id, None)
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -41,13 +107,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Worker threads for sync (def) routes; anyio's default is 40
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", str(max(40, DB_MAX_CONNECTIONS))))
+
+# Connection pool metrics, sampled in the background (see sample_pool_stats)
+POOL_STATS_INTERVAL = int(os.getenv("POOL_STATS_INTERVAL", "5"))
+POOL_SIZE = Gauge("db_pool_size", "Configured connection pool size", ["engine"])
+POOL_CHECKED_IN = Gauge("db_pool_checked_in", "Idle connections in the pool", ["engine"])
+POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently in use", ["engine"])
+POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections opened beyond pool_size", ["engine"])
+
+# Label value -> engine; most traffic (token checks, every GET) goes through "read"
+POOL_ENGINES = {"write": engine, "read": ro_engine}
+
+
+async def sample_pool_stats():
+    """Publish connection pool utilization to Prometheus every few seconds"""
+    while True:
+        for label, pool_engine in POOL_ENGINES.items():
+            pool = pool_engine.pool
+            POOL_SIZE.labels(label).set(pool.size())
+            POOL_CHECKED_IN.labels(label).set(pool.checkedin())
+            POOL_CHECKED_OUT.labels(label).set(pool.checkedout())
+            POOL_OVERFLOW.labels(label).set(pool.overflow())
+        await asyncio.sleep(POOL_STATS_INTERVAL)
+
 # main.py or a new utils.py file
 
 
+# Secondary indexes for the analytics and lookup hot paths
+ACTIVITY_INDEXES = {
+    # Covers the per-day GROUP BY, sums and mood averages without touching the base
+    # rows, so /summary, /trends and /auth/stats read the index alone
+    "idx_act_user_date_cat_mood": "(user_id, activity_date, category, duration_minutes, mood_rating)",
+    # Per-category trend and streak lookups
+    "idx_act_user_cat_date": "(user_id, category, activity_date)",
+    # GET /activities ordering and keyset paging; InnoDB appends the primary key, so
+    # (activity_date, id) order is read off the index without a filesort
+    "idx_act_user_date": "(user_id, activity_date)",
+}
+
+# "Duplicate key name": another worker booting at the same time created the index
+# first, which leaves the schema exactly as intended
+ER_DUP_KEYNAME = 1061
+
+def create_index(cursor, statement: str):
+    """Run a CREATE INDEX, treating an index another worker just created as success"""
+    try:
+        cursor.execute(statement)
+    except DatabaseError as e:
+        if not e.args or e.args[0] != ER_DUP_KEYNAME:
+            raise
+
+def ensure_indexes():
+    """Create any missing activity and user indexes (MySQL has no CREATE INDEX IF NOT EXISTS)"""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT DISTINCT index_name FROM information_schema.statistics 
+               WHERE table_schema = DATABASE() AND table_name = 'activities'"""
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for name, columns in ACTIVITY_INDEXES.items():
+            if name not in existing:
+                create_index(cursor, f"CREATE INDEX {name} ON activities {columns}")
+        
+        # Register and login look users up by email; any index led by email (such as
+        # a UNIQUE key) already serves that, so only add one when there is none
+        cursor.execute(
+            """SELECT 1 FROM information_schema.statistics 
+               WHERE table_schema = DATABASE() AND table_name = 'users'
+                 AND column_name = 'email' AND seq_in_index = 1
+               LIMIT 1"""
+        )
+        if cursor.fetchone() is None:
+            create_index(cursor, "CREATE INDEX idx_users_email ON users (email)")
+        conn.commit()
+
 def init_db():
     """Initializes tables in Railway's preconfigured DB"""
     try:
         Base.metadata.create_all(bind=engine)
+        ensure_indexes()
         print("✅ Tables created successfully.")
     except Exception as e:
         print(f"❌ Error initializing DB: {e}")
@@ -175,39 +316,130 @@ CATEGORIES = {
     "Transportation/Commute": {"icon": "🚗", "color": "#ffd93d"},
     "Learning/Skill Development": {"icon": "📚", "color": "#6c5ce7"}
 }
+CATEGORY_NAMES = tuple(CATEGORIES)
+
+# Static payloads, encoded once at import
+ROOT_JSON = orjson.dumps({
+    "message": "Daily Tracker API is running with MySQL", 
+    "status": "healthy",
+    "version": "1.0.0",
+    "documentation": "/docs"
+})
+CATEGORIES_JSON = orjson.dumps({"categories": CATEGORIES})
+
+# Categories only change with a deploy, so clients and proxies may reuse them for an hour
+CATEGORIES_HEADERS = {"Cache-Control": "public, max-age=3600"}
+
+# Activity fields returned by the API, in response order. Rows selected with these
+# columns go straight to orjson, which encodes date/datetime natively.
+ACTIVITY_FIELDS = ("id", "category", "duration_minutes", "notes", "mood_rating", "photo_url", "activity_date", "created_at")
+ACTIVITY_COLUMNS = ", ".join(ACTIVITY_FIELDS)
+
+# Same without the notes/photo_url TEXT columns, for compact list views
+ACTIVITY_SUMMARY_FIELDS = tuple(f for f in ACTIVITY_FIELDS if f not in ("notes", "photo_url"))
+
+# Upper bound on IDs per bulk delete, keeps the JSON parameter well under max_allowed_packet
+MAX_BULK_DELETE_IDS = 10_000
+
+# Rows per chunk when streaming list responses
+STREAM_BATCH_SIZE = 500
+
+# Largest page GET /activities will serve when a limit is requested
+MAX_PAGE_SIZE = 1000
+
+# Daily summary in one statement: per-category totals for the day, zero rows for
+# predefined categories with no entries, each category's share of the day and
+# the number of categories logged, via window sums. Category names are bound
+# after (user_id, date).
+DAILY_SUMMARY_QUERY = f"""
+    WITH totals AS (
+        SELECT category, SUM(duration_minutes) AS total_minutes,
+               COUNT(*) AS entry_count, AVG(mood_rating) AS avg_mood
+        FROM activities
+        WHERE user_id = %s AND activity_date = %s
+        GROUP BY category
+    ), cats(category) AS (
+        VALUES {', '.join(['ROW(%s)'] * len(CATEGORY_NAMES))}
+    )
+    SELECT category, total_minutes, entry_count, avg_mood,
+           SUM(total_minutes) OVER () AS day_minutes,
+           total_minutes * 100 / NULLIF(SUM(total_minutes) OVER (), 0) AS percentage,
+           SUM(total_minutes > 0) OVER () AS logged_categories
+    FROM (
+        SELECT category, total_minutes, entry_count, avg_mood FROM totals
+        UNION ALL
+        SELECT category, 0, 0, NULL FROM cats
+        WHERE category NOT IN (SELECT category FROM totals)
+    ) AS summary
+"""
 
 # Utility functions
 
+# argon2id with a per-hash random salt; cost parameters are stored in the hash itself
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
 def hash_password(password: str) -> str:
-    """Hash password using SHA-256 with salt"""
-    salt = "daily_tracker_salt"  # In production, use a proper random salt per user
+    """Hash password using argon2id"""
+    return password_hasher.hash(password)
+
+# Verified against when the email is unknown, so a miss costs the same as a wrong password
+DUMMY_PASSWORD_HASH = hash_password("daily-tracker-dummy-password")
+
+def legacy_hash_password(password: str) -> str:
+    """SHA-256 hash used before argon2; only kept to verify old accounts"""
+    salt = "daily_tracker_salt"
     return hashlib.sha256((password + salt).encode()).hexdigest()
 
 def verify_password(password: str, hashed: str) -> bool:
     """Verify password against hash"""
-    return hash_password(password) == hashed
+    if not hashed.startswith("$argon2"):
+        # Pay for one argon2 verify here too, so a legacy account answers as slowly
+        # as an argon2 one or an unknown email and can't be told apart by timing
+        try:
+            password_hasher.verify(DUMMY_PASSWORD_HASH, password)
+        except (VerificationError, InvalidHashError):
+            pass
+        return hmac.compare_digest(legacy_hash_password(password), hashed)
+    try:
+        return password_hasher.verify(hashed, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def password_needs_rehash(hashed: str) -> bool:
+    """Check if a stored hash is legacy SHA-256 or uses outdated argon2 parameters"""
+    return not hashed.startswith("$argon2") or password_hasher.check_needs_rehash(hashed)
+
+TOKEN_LIFETIME_SECONDS = 30 * 24 * 60 * 60
 
 def create_token(user_id: int) -> str:
     """Create JWT token with user info"""
+    # Epoch seconds are what PyJWT would turn datetimes into anyway
+    now = int(time.time())
     payload = {
         "user_id": user_id,
-        "exp": datetime.utcnow() + timedelta(days=30),
-        "iat": datetime.utcnow(),
+        "exp": now + TOKEN_LIFETIME_SECONDS,
+        "iat": now,
         "type": "access_token"
     }
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
+def verify_token(token: str) -> int:
     """Verify JWT token and return user_id with enhanced validation"""
     try:
-        if not credentials.credentials:
+        if not token:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token is missing",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=["HS256"])
+        cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+        with token_cache_lock:
+            cached = token_cache.get(cache_key)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        
+        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
         user_id = payload.get("user_id")
         token_type = payload.get("type")
         
@@ -226,8 +458,8 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
             )
         
         # Verify user still exists and is active
-        with get_db() as conn:
-            cursor = conn.cursor(dictionary=True)
+        with get_connection(read_only=True) as conn:
+            cursor = conn.cursor(DictCursor)
             cursor.execute(
                 "SELECT id, is_active FROM users WHERE id = %s",
                 (user_id,)
@@ -241,6 +473,10 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
                     headers={"WWW-Authenticate": "Bearer"},
                 )
         
+        # Only successful verifications are cached
+        with token_cache_lock:
+            token_cache[cache_key] = (user_id, payload["exp"])
+        
         return user_id
         
     except jwt.ExpiredSignatureError:
@@ -255,31 +491,84 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
             detail=f"Invalid token: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token validation failed",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+class AuthMiddleware(BaseHTTPMiddleware):
+    """Verify the bearer token once per request and stash the result on request.state"""
+    async def dispatch(self, request: Request, call_next):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                # verify_token may hit the database, keep it off the event loop
+                request.state.user_id = await run_in_threadpool(verify_token, token)
+            except HTTPException as e:
+                request.state.auth_error = e
+        # Public paths (static files, /categories, /auth/*) simply never ask for current_user
+        return await call_next(request)
+
+def current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
+    """Return the user_id AuthMiddleware resolved for this request"""
+    # credentials only enforces the header and documents the scheme in OpenAPI
+    user_id = getattr(request.state, "user_id", None)
+    if user_id is None:
+        raise getattr(request.state, "auth_error", None) or HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user_id
+
+app.add_middleware(AuthMiddleware)
 # API Endpoints
-@app.on_event("startup")
-async def startup_event():
-    """Initialize database on startup"""
-    init_db()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize database on startup, release connections on shutdown"""
+    dispose_for_worker()
+    # Sync routes share anyio's thread limiter; keep it at least as large as the
+    # connection pools so threads, not connections, are never the first to run out
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    # DDL and pool warmup block on the network, keep them off the event loop.
+    # Multi-worker deploys should set DT_RUN_MIGRATIONS=0 and run `python migrate.py`
+    # once instead, so workers don't race each other for DDL metadata locks
+    if os.getenv("DT_RUN_MIGRATIONS", "1") == "1":
+        await run_in_threadpool(init_db)
+    await run_in_threadpool(warmup)
+    pool_stats_task = asyncio.create_task(sample_pool_stats())
+    try:
+        yield
+    finally:
+        pool_stats_task.cancel()
+        await run_in_threadpool(close_engines)
+
+app.router.lifespan_context = lifespan
+
+# The UI page is read once; the ETag lets browsers revalidate with a bodyless 304
+INDEX_HTML = Path("static/index.html").read_bytes()
+INDEX_ETAG = '"' + hashlib.blake2b(INDEX_HTML, digest_size=16).hexdigest() + '"'
+INDEX_HEADERS = {"ETag": INDEX_ETAG, "Cache-Control": "public, max-age=60"}
+
+@app.get("/", include_in_schema=False)
+async def serve_ui(request: Request):
+    if request.headers.get("if-none-match") == INDEX_ETAG:
+        return Response(status_code=304, headers=INDEX_HEADERS)
+    return Response(content=INDEX_HTML, media_type="text/html", headers=INDEX_HEADERS)
+
 @app.get("/api")
 async def root():
-    return {
-        "message": "Daily Tracker API is running with MySQL", 
-        "status": "healthy",
-        "version": "1.0.0",
-        "documentation": "/docs"
-    }
+    return Response(content=ROOT_JSON, media_type="application/json")
 
 @app.get("/health")
-async def health_check():
+def health_check():
     """Health check endpoint"""
     try:
-        with get_db() as conn:
+        with get_connection(read_only=True) as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT 1")
             cursor.fetchone()
@@ -290,16 +579,16 @@ async def health_check():
 @app.get("/categories")
 async def get_categories():
     """Get all available categories"""
-    return {"categories": CATEGORIES}
+    return Response(content=CATEGORIES_JSON, media_type="application/json", headers=CATEGORIES_HEADERS)
 
 # ===== AUTHENTICATION ENDPOINTS =====
 
 @app.post("/auth/register")
-async def register(user: UserCreate):
+def register(user: UserCreate):
     """Register a new user with enhanced validation"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor(dictionary=True)
+        with get_connection() as conn:
+            cursor = conn.cursor(DictCursor)
             
             # Check if user already exists
             cursor.execute("SELECT id FROM users WHERE email = %s", (user.email.lower(),))
@@ -308,9 +597,14 @@ async def register(user: UserCreate):
                     status_code=status.HTTP_400_BAD_REQUEST, 
                     detail="Email already registered"
                 )
+        
+        # Hash with no pooled connection checked out, as in login
+        password_hash = hash_password(user.password)
+        
+        with get_connection() as conn:
+            cursor = conn.cursor()
             
             # Create new user
-            password_hash = hash_password(user.password)
             cursor.execute(
                 """INSERT INTO users (email, password_hash, name, age, gender, is_active) 
                    VALUES (%s, %s, %s, %s, %s, %s)""",
@@ -318,19 +612,19 @@ async def register(user: UserCreate):
             )
             user_id = cursor.lastrowid
             conn.commit()
-            
-            # Create token
-            token = create_token(user_id)
-            
-            return {
-                "message": "User registered successfully",
-                "token": token,
-                "user": {
-                    "id": user_id,
-                    "email": user.email.lower(),
-                    "name": user.name
-                }
+        
+        # Create token
+        token = create_token(user_id)
+        
+        return {
+            "message": "User registered successfully",
+            "token": token,
+            "user": {
+                "id": user_id,
+                "email": user.email.lower(),
+                "name": user.name
             }
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -342,57 +636,62 @@ async def register(user: UserCreate):
     
 
 @app.post("/auth/login")
-async def login(user: UserLogin):
+def login(user: UserLogin):
     """Login user with enhanced validation"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor(dictionary=True)
+        with get_connection() as conn:
+            cursor = conn.cursor(DictCursor)
             cursor.execute(
                 "SELECT id, password_hash, name, is_active FROM users WHERE email = %s",
                 (user.email.lower(),)
             )
             db_user = cursor.fetchone()
-            
-            # Check if user exists
-            if not db_user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid email or password"
-                )
-            
-            # Check if account is active
-            if not db_user.get('is_active', True):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Account is deactivated"
+        
+        # Hashing happens with no pooled connection checked out. Unknown emails still
+        # pay for a verify, and the password is checked before the account state so
+        # neither path reveals whether an email is registered.
+        stored_hash = db_user['password_hash'] if db_user else DUMMY_PASSWORD_HASH
+        if not verify_password(user.password, stored_hash) or not db_user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid email or password"
+            )
+        
+        # Check if account is active
+        if not db_user.get('is_active', True):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Account is deactivated"
+            )
+        
+        # Update last login, upgrading legacy password hashes while we have the plaintext
+        new_hash = hash_password(user.password) if password_needs_rehash(stored_hash) else None
+        with get_connection() as conn:
+            cursor = conn.cursor()
+            if new_hash:
+                cursor.execute(
+                    "UPDATE users SET last_login = %s, password_hash = %s WHERE id = %s",
+                    (datetime.utcnow(), new_hash, db_user['id'])
                 )
-            
-            # Verify password
-            if not verify_password(user.password, db_user['password_hash']):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid email or password"
+            else:
+                cursor.execute(
+                    "UPDATE users SET last_login = %s WHERE id = %s",
+                    (datetime.utcnow(), db_user['id'])
                 )
-            
-            # Update last login
-            cursor.execute(
-                "UPDATE users SET last_login = %s WHERE id = %s",
-                (datetime.utcnow(), db_user['id'])
-            )
             conn.commit()
-            
-            # Create token
-            token = create_token(db_user['id'])
-            
-            return {
-                "message": "Login successful",
-                "token": token,
-                "user": {
-                    "id": db_user['id'],
-                    "email": user.email.lower(),
-                    "name": db_user['name']
-                }
+        
+        # Create token
+        token = create_token(db_user['id'])
+        
+        return {
+            "message": "Login successful",
+            "token": token,
+            "user": {
+                "id": db_user['id'],
+                "email": user.email.lower(),
+                "name": db_user['name']
             }
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -404,10 +703,10 @@ async def login(user: UserLogin):
 # ===== USER MANAGEMENT ENDPOINTS =====
 
 @app.get("/auth/profile")
-async def get_user_profile(user_id: int = Depends(verify_token)):
+def get_user_profile(user_id: int = Depends(current_user)):
     """Get current user profile"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    with get_connection(read_only=True) as conn:
+        cursor = conn.cursor(DictCursor)
         cursor.execute(
             "SELECT id, email, name, age, gender, created_at FROM users WHERE id = %s",
             (user_id,)
@@ -429,10 +728,10 @@ async def get_user_profile(user_id: int = Depends(verify_token)):
         }
 
 @app.put("/auth/profile")
-async def update_user_profile(user_update: UserUpdate, user_id: int = Depends(verify_token)):
+def update_user_profile(user_update: UserUpdate, user_id: int = Depends(current_user)):
     """Update user profile information"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    with get_connection() as conn:
+        cursor = conn.cursor(DictCursor)
         
         # Build dynamic update query
         update_fields = []
@@ -493,10 +792,10 @@ async def update_user_profile(user_update: UserUpdate, user_id: int = Depends(ve
         }
 
 @app.put("/auth/password")
-async def update_password(password_update: PasswordUpdate, user_id: int = Depends(verify_token)):
+def update_password(password_update: PasswordUpdate, user_id: int = Depends(current_user)):
     """Update user password"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    with get_connection() as conn:
+        cursor = conn.cursor(DictCursor)
         
         # Get current password hash
         cursor.execute(
@@ -504,28 +803,31 @@ async def update_password(password_update: PasswordUpdate, user_id: int = Depend
             (user_id,)
         )
         user = cursor.fetchone()
-        
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Verify current password
-        if not verify_password(password_update.current_password, user['password_hash']):
-            raise HTTPException(status_code=400, detail="Current password is incorrect")
+    
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Verify and hash with no pooled connection checked out, as in login
+    if not verify_password(password_update.current_password, user['password_hash']):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+    new_password_hash = hash_password(password_update.new_password)
+    
+    with get_connection() as conn:
+        cursor = conn.cursor()
         
         # Update password
-        new_password_hash = hash_password(password_update.new_password)
         cursor.execute(
             "UPDATE users SET password_hash = %s WHERE id = %s",
             (new_password_hash, user_id)
         )
         conn.commit()
-        
-        return {"message": "Password updated successfully"}
+    
+    return {"message": "Password updated successfully"}
 
 @app.delete("/auth/user")
-async def delete_user(user_id: int = Depends(verify_token)):
+def delete_user(user_id: int = Depends(current_user)):
     """Delete the authenticated user and all their activities"""
-    with get_db() as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         
         # Check if user exists
@@ -536,35 +838,28 @@ async def delete_user(user_id: int = Depends(verify_token)):
         # Delete user (activities will be deleted due to CASCADE)
         cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
         conn.commit()
+        invalidate_user_cache(user_id)
         
         return {"message": "User account and all associated data deleted successfully"}
 
 @app.get("/auth/stats")
-async def get_user_stats(user_id: int = Depends(verify_token)):
+def get_user_stats(user_id: int = Depends(current_user)):
     """Get user statistics"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Total activities
-        cursor.execute(
-            "SELECT COUNT(*) as total_activities FROM activities WHERE user_id = %s",
-            (user_id,)
-        )
-        total_activities = cursor.fetchone()['total_activities']
-        
-        # Total minutes tracked
-        cursor.execute(
-            "SELECT SUM(duration_minutes) as total_minutes FROM activities WHERE user_id = %s",
-            (user_id,)
-        )
-        total_minutes = cursor.fetchone()['total_minutes'] or 0
+    with get_connection(read_only=True) as conn:
+        cursor = conn.cursor(DictCursor)
         
-        # Days with activities
+        # Totals in one pass over the user's rows (all served by idx_act_user_date_cat_mood)
         cursor.execute(
-            "SELECT COUNT(DISTINCT activity_date) as active_days FROM activities WHERE user_id = %s",
+            """SELECT COUNT(*) as total_activities,
+                      SUM(duration_minutes) as total_minutes,
+                      COUNT(DISTINCT activity_date) as active_days
+               FROM activities WHERE user_id = %s""",
             (user_id,)
         )
-        active_days = cursor.fetchone()['active_days']
+        totals = cursor.fetchone()
+        total_activities = totals['total_activities']
+        total_minutes = totals['total_minutes'] or 0
+        active_days = totals['active_days']
         
         # Most tracked category
         cursor.execute(
@@ -593,84 +888,143 @@ async def get_user_stats(user_id: int = Depends(verify_token)):
 # ===== ACTIVITY ENDPOINTS =====
 
 @app.post("/activities", response_model=ActivityResponse)
-async def create_activity(activity: ActivityCreate, user_id: int = Depends(verify_token)):
+def create_activity(activity: ActivityCreate, user_id: int = Depends(current_user)):
     """Create a new activity entry"""
     activity_date = activity.activity_date or date.today()
+    # Naive UTC at the column's second precision, written explicitly so the row and
+    # the response below carry the same value
+    created_at = datetime.now(timezone.utc).replace(microsecond=0, tzinfo=None)
     
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    with get_connection() as conn:
+        cursor = conn.cursor(DictCursor)
         cursor.execute(
             """INSERT INTO activities 
-               (user_id, category, duration_minutes, notes, mood_rating, photo_url, activity_date)
-               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+               (user_id, category, duration_minutes, notes, mood_rating, photo_url, activity_date, created_at)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
             (user_id, activity.category, activity.duration_minutes, activity.notes,
-             activity.mood_rating, activity.photo_url, activity_date)
+             activity.mood_rating, activity.photo_url, activity_date, created_at)
         )
         activity_id = cursor.lastrowid
         conn.commit()
+        invalidate_user_cache(user_id)
         
-        # Fetch the created activity
-        cursor.execute(
-            "SELECT * FROM activities WHERE id = %s", (activity_id,)
-        )
-        created_activity = cursor.fetchone()
-        
-        return ActivityResponse(
-            id=created_activity['id'],
-            category=created_activity['category'],
-            duration_minutes=created_activity['duration_minutes'],
-            notes=created_activity['notes'],
-            mood_rating=created_activity['mood_rating'],
-            photo_url=created_activity['photo_url'],
-            activity_date=created_activity['activity_date'],
-            created_at=created_activity['created_at']
-        )
+        # Every field is already known and validated, so nothing is read back.
+        # Returning a Response skips re-validating against response_model, which
+        # stays on the route for the OpenAPI schema.
+        return ORJSONResponse({
+            "id": activity_id,
+            "category": activity.category,
+            "duration_minutes": activity.duration_minutes,
+            "notes": activity.notes,
+            "mood_rating": activity.mood_rating,
+            "photo_url": activity.photo_url,
+            "activity_date": activity_date,
+            "created_at": created_at
+        })
+
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that always finalizes its body, even when the client goes away"""
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # A disconnect leaves the generator suspended at a yield; close it now
+            # rather than whenever the garbage collector gets to it
+            with CancelScope(shield=True):
+                await self.body_iterator.aclose()
 
 @app.get("/activities")
-async def get_activities(
-    activity_date: Optional[str] = None,
-    user_id: int = Depends(verify_token)
+def get_activities(
+    activity_date: Optional[date] = None,
+    compact: bool = False,
+    limit: Optional[int] = None,
+    before_date: Optional[date] = None,
+    before_id: Optional[int] = None,
+    user_id: int = Depends(current_user)
 ):
-    """Get activities for a specific date or all activities"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
-        
-        if activity_date:
-            cursor.execute(
-                "SELECT * FROM activities WHERE user_id = %s AND activity_date = %s ORDER BY created_at DESC",
-                (user_id, activity_date)
-            )
-        else:
-            cursor.execute(
-                "SELECT * FROM activities WHERE user_id = %s ORDER BY activity_date DESC, created_at DESC",
-                (user_id,)
-            )
-        
-        activities = cursor.fetchall()
-        
-        return {
-            "activities": [
-                {
-                    "id": activity['id'],
-                    "category": activity['category'],
-                    "duration_minutes": activity['duration_minutes'],
-                    "notes": activity['notes'],
-                    "mood_rating": activity['mood_rating'],
-                    "photo_url": activity['photo_url'],
-                    "activity_date": activity['activity_date'].strftime('%Y-%m-%d') if isinstance(activity['activity_date'], date) else activity['activity_date'],
-                    "created_at": activity['created_at'].isoformat() if isinstance(activity['created_at'], datetime) else activity['created_at']
-                }
-                for activity in activities
-            ]
-        }
+    """Get activities for a specific date or all activities (compact=true skips notes/photo_url, limit pages newest first)"""
+    if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {MAX_PAGE_SIZE}"
+        )
+    if (before_date is None) != (before_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="before_date and before_id must be given together"
+        )
+    
+    fields = ACTIVITY_SUMMARY_FIELDS if compact else ACTIVITY_FIELDS
+    columns = ", ".join(fields)
+    
+    conditions = ["user_id = %s"]
+    params = [user_id]
+    if activity_date:
+        conditions.append("activity_date = %s")
+        params.append(activity_date)
+    if before_id is not None:
+        # Keyset: resume strictly after the last row served, walking the index
+        # instead of skipping OFFSET rows
+        conditions.append("(activity_date < %s OR (activity_date = %s AND id < %s))")
+        params += [before_date, before_date, before_id]
+    # ids are assigned in insert order, so id DESC is newest first within a day and
+    # comes straight off the (user_id, activity_date) index
+    query = f"SELECT {columns} FROM activities WHERE {' AND '.join(conditions)} ORDER BY activity_date DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+    
+    # Check out and execute here, before any headers go out, so pool timeouts and
+    # query errors still surface as a 500. The stream owns the cursor from then on.
+    resources = ExitStack()
+    try:
+        conn = resources.enter_context(get_connection(read_only=True))
+        # Unbuffered cursor: rows are encoded as they arrive instead of loading the
+        # whole history into memory first
+        cursor = conn.cursor(SSCursor)
+        # Closing drains any unread rows so the connection goes back to the pool clean
+        resources.callback(cursor.close)
+        cursor.execute(query, params)
+    except BaseException:
+        resources.close()
+        raise
+    
+    async def stream_activities():
+        try:
+            yield b'{"activities":['
+            separator = b''
+            count = 0
+            last = None
+            while True:
+                rows = await run_in_threadpool(cursor.fetchmany, STREAM_BATCH_SIZE)
+                if not rows:
+                    break
+                yield separator + b','.join(orjson.dumps(dict(zip(fields, row))) for row in rows)
+                separator = b','
+                count += len(rows)
+                last = dict(zip(fields, rows[-1]))
+            if limit is None:
+                yield b']}'
+            else:
+                # A full page may have more behind it; pass these back as before_date/before_id
+                next_cursor = None
+                if count == limit:
+                    next_cursor = {"before_date": last["activity_date"], "before_id": last["id"]}
+                yield b'],"next":' + orjson.dumps(next_cursor) + b'}'
+        finally:
+            # Shielded, so a disconnect's cancellation can't skip returning the connection
+            with CancelScope(shield=True):
+                await run_in_threadpool(resources.close)
+    
+    return ClosingStreamingResponse(stream_activities(), media_type="application/json")
 
 @app.get("/activities/{activity_id}")
-async def get_activity(activity_id: int, user_id: int = Depends(verify_token)):
+def get_activity(activity_id: int, user_id: int = Depends(current_user)):
     """Get a specific activity by ID"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    with get_connection(read_only=True) as conn:
+        cursor = conn.cursor(DictCursor)
         cursor.execute(
-            "SELECT * FROM activities WHERE id = %s AND user_id = %s",
+            f"SELECT {ACTIVITY_COLUMNS} FROM activities WHERE id = %s AND user_id = %s",
             (activity_id, user_id)
         )
         activity = cursor.fetchone()
@@ -678,37 +1032,29 @@ async def get_activity(activity_id: int, user_id: int = Depends(verify_token)):
         if not activity:
             raise HTTPException(status_code=404, detail="Activity not found")
         
-        return {
-            "activity": {
-                "id": activity['id'],
-                "category": activity['category'],
-                "duration_minutes": activity['duration_minutes'],
-                "notes": activity['notes'],
-                "mood_rating": activity['mood_rating'],
-                "photo_url": activity['photo_url'],
-                "activity_date": activity['activity_date'].strftime('%Y-%m-%d') if activity['activity_date'] else None,
-                "created_at": activity['created_at'].isoformat() if activity['created_at'] else None
-            }
-        }
+        return ORJSONResponse({"activity": activity})
 
 @app.put("/activities/{activity_id}")
-async def update_activity(
+def update_activity(
     activity_id: int, 
     activity: ActivityCreate, 
-    user_id: int = Depends(verify_token)
+    user_id: int = Depends(current_user)
 ):
     """Update an activity"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    with get_connection() as conn:
+        cursor = conn.cursor(DictCursor)
         
-        # Check if activity exists and belongs to user
+        # Check if activity exists and belongs to user (created_at is the only field we don't write)
         cursor.execute(
-            "SELECT id FROM activities WHERE id = %s AND user_id = %s",
+            "SELECT created_at FROM activities WHERE id = %s AND user_id = %s",
             (activity_id, user_id)
         )
-        if not cursor.fetchone():
+        existing = cursor.fetchone()
+        if not existing:
             raise HTTPException(status_code=404, detail="Activity not found")
         
+        activity_date = activity.activity_date or date.today()
+        
         # Update activity
         cursor.execute(
             """UPDATE activities 
@@ -717,35 +1063,62 @@ async def update_activity(
                WHERE id = %s AND user_id = %s""",
             (activity.category, activity.duration_minutes, activity.notes,
              activity.mood_rating, activity.photo_url, 
-             activity.activity_date or date.today(), activity_id, user_id)
+             activity_date, activity_id, user_id)
         )
         conn.commit()
+        invalidate_user_cache(user_id)
         
         # Return updated activity
+        return ORJSONResponse({
+            "message": "Activity updated successfully",
+            "activity": {
+                "id": activity_id,
+                "category": activity.category,
+                "duration_minutes": activity.duration_minutes,
+                "notes": activity.notes,
+                "mood_rating": activity.mood_rating,
+                "photo_url": activity.photo_url,
+                "activity_date": activity_date,
+                "created_at": existing['created_at']
+            }
+        })
+
+# Declared before /activities/{activity_id}, otherwise "bulk" is parsed as an id
+@app.delete("/activities/bulk")
+def delete_multiple_activities(
+    activity_ids: List[int], 
+    user_id: int = Depends(current_user)
+):
+    """Delete multiple activities at once"""
+    if not activity_ids:
+        raise HTTPException(status_code=400, detail="No activity IDs provided")
+    if len(activity_ids) > MAX_BULK_DELETE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DELETE_IDS} activity IDs per request")
+    
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        
+        # IDs travel as one JSON array parameter, so the statement text is the same
+        # whatever the batch size
         cursor.execute(
-            "SELECT * FROM activities WHERE id = %s",
-            (activity_id,)
+            """DELETE a FROM activities a
+               JOIN JSON_TABLE(%s, '$[*]' COLUMNS (id BIGINT PATH '$')) AS ids ON a.id = ids.id
+               WHERE a.user_id = %s""",
+            (orjson.dumps(activity_ids).decode(), user_id)
         )
-        updated_activity = cursor.fetchone()
+        deleted_count = cursor.rowcount
+        conn.commit()
+        invalidate_user_cache(user_id)
         
         return {
-            "message": "Activity updated successfully",
-            "activity": {
-                "id": updated_activity['id'],
-                "category": updated_activity['category'],
-                "duration_minutes": updated_activity['duration_minutes'],
-                "notes": updated_activity['notes'],
-                "mood_rating": updated_activity['mood_rating'],
-                "photo_url": updated_activity['photo_url'],
-                "activity_date": updated_activity['activity_date'].strftime('%Y-%m-%d') if updated_activity['activity_date'] else None,
-                "created_at": updated_activity['created_at'].isoformat() if updated_activity['created_at'] else None
-            }
+            "message": f"Successfully deleted {deleted_count} activities",
+            "deleted_count": deleted_count
         }
 
 @app.delete("/activities/{activity_id}")
-async def delete_activity(activity_id: int, user_id: int = Depends(verify_token)):
+def delete_activity(activity_id: int, user_id: int = Depends(current_user)):
     """Delete an activity"""
-    with get_db() as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "DELETE FROM activities WHERE id = %s AND user_id = %s",
@@ -756,43 +1129,57 @@ async def delete_activity(activity_id: int, user_id: int = Depends(verify_token)
             raise HTTPException(status_code=404, detail="Activity not found or doesn't belong to user")
         
         conn.commit()
+        invalidate_user_cache(user_id)
         return {"message": "Activity deleted successfully"}
 
 # ===== BULK OPERATIONS =====
 
-@app.delete("/activities/bulk")
-async def delete_multiple_activities(
-    activity_ids: List[int], 
-    user_id: int = Depends(verify_token)
+MAX_BULK_ACTIVITIES = 1000
+
+@app.post("/activities/bulk")
+def create_multiple_activities(
+    activities: List[ActivityCreate], 
+    user_id: int = Depends(current_user)
 ):
-    """Delete multiple activities at once"""
-    if not activity_ids:
-        raise HTTPException(status_code=400, detail="No activity IDs provided")
+    """Create multiple activities in a single INSERT"""
+    if not activities:
+        raise HTTPException(status_code=400, detail="No activities provided")
+    if len(activities) > MAX_BULK_ACTIVITIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ACTIVITIES} activities per request")
     
-    with get_db() as conn:
+    today = date.today()
+    values = [
+        (user_id, activity.category, activity.duration_minutes, activity.notes,
+         activity.mood_rating, activity.photo_url, activity.activity_date or today)
+        for activity in activities
+    ]
+    
+    with get_connection() as conn:
         cursor = conn.cursor()
         
-        # Create placeholders for the IN clause
-        placeholders = ','.join(['%s'] * len(activity_ids))
-        query = f"DELETE FROM activities WHERE id IN ({placeholders}) AND user_id = %s"
-        
-        # Execute delete
-        cursor.execute(query, activity_ids + [user_id])
-        deleted_count = cursor.rowcount
+        # The driver rewrites this into one multi-row INSERT ... VALUES (...), (...)
+        cursor.executemany(
+            """INSERT INTO activities 
+               (user_id, category, duration_minutes, notes, mood_rating, photo_url, activity_date)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            values
+        )
+        created_count = cursor.rowcount
         conn.commit()
+        invalidate_user_cache(user_id)
         
         return {
-            "message": f"Successfully deleted {deleted_count} activities",
-            "deleted_count": deleted_count
+            "message": f"Successfully created {created_count} activities",
+            "created_count": created_count
         }
 
 @app.delete("/activities/date/{activity_date}")
-async def delete_activities_by_date(
-    activity_date: str, 
-    user_id: int = Depends(verify_token)
+def delete_activities_by_date(
+    activity_date: date, 
+    user_id: int = Depends(current_user)
 ):
     """Delete all activities for a specific date"""
-    with get_db() as conn:
+    with get_connection() as conn:
         cursor = conn.cursor()
         cursor.execute(
             "DELETE FROM activities WHERE activity_date = %s AND user_id = %s",
@@ -800,6 +1187,7 @@ async def delete_activities_by_date(
         )
         deleted_count = cursor.rowcount
         conn.commit()
+        invalidate_user_cache(user_id)
         
         return {
             "message": f"Successfully deleted {deleted_count} activities for {activity_date}",
@@ -810,151 +1198,122 @@ async def delete_activities_by_date(
 # ===== SUMMARY AND ANALYTICS ENDPOINTS =====
 
 @app.get("/summary/{summary_date}")
-async def get_daily_summary(summary_date: str, user_id: int = Depends(verify_token)):
+def get_daily_summary(summary_date: date, user_id: int = Depends(current_user)):
     """Get daily summary for a specific date"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            """SELECT category, SUM(duration_minutes) as total_minutes, 
-               COUNT(*) as entry_count, AVG(mood_rating) as avg_mood
-               FROM activities 
-               WHERE user_id = %s AND activity_date = %s
-               GROUP BY category""",
-            (user_id, summary_date)
-        )
-        
+    cache_key = ("summary", summary_date)
+    cached, generation = get_cached_response(user_id, cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
+    with get_connection(read_only=True) as conn:
+        cursor = conn.cursor(DictCursor)
+        cursor.execute(DAILY_SUMMARY_QUERY, (user_id, summary_date, *CATEGORY_NAMES))
         category_data = cursor.fetchall()
         
-        # Calculate summary
-        total_logged_minutes = sum(row['total_minutes'] for row in category_data)
-        categories = {}
-        
-        for row in category_data:
-            categories[row['category']] = {
+        total_logged_minutes = int(category_data[0]['day_minutes']) if category_data else 0
+        categories = {
+            row['category']: {
                 "duration_minutes": int(row['total_minutes']),
                 "entry_count": row['entry_count'],
                 "average_mood": round(float(row['avg_mood']), 1) if row['avg_mood'] else None,
-                "percentage": round((int(row['total_minutes']) / total_logged_minutes * 100), 1) if total_logged_minutes > 0 else 0
+                "percentage": round(float(row['percentage']), 1) if row['percentage'] else 0
             }
+            for row in category_data
+        }
         
-        # Add missing categories
-        for category in CATEGORIES:
-            if category not in categories:
-                categories[category] = {
-                    "duration_minutes": 0,
-                    "entry_count": 0,
-                    "average_mood": None,
-                    "percentage": 0
-                }
-        
-        completion_percentage = (len([c for c in categories if categories[c]['duration_minutes'] > 0]) / len(CATEGORIES)) * 100
+        logged_categories = int(category_data[0]['logged_categories']) if category_data else 0
+        completion_percentage = logged_categories / len(CATEGORY_NAMES) * 100
         
-        return DailySummary(
-            date=datetime.strptime(summary_date, '%Y-%m-%d').date(),
+        summary = DailySummary(
+            date=summary_date,
             total_logged_minutes=total_logged_minutes,
             categories=categories,
             completion_percentage=round(completion_percentage, 1)
         )
+        content = encode_response(summary)
+        set_cached_response(user_id, cache_key, content, generation)
+        return Response(content=content, media_type="application/json")
 
 @app.get("/trends")
-async def get_trends(user_id: int = Depends(verify_token)):
+def get_trends(user_id: int = Depends(current_user)):
     """Get trend data for all categories"""
-    with get_db() as conn:
-        cursor = conn.cursor(dictionary=True)
+    # Keyed by day, since the windows and streaks are relative to today
+    end_date = date.today()
+    cache_key = ("trends", end_date)
+    cached, generation = get_cached_response(user_id, cache_key)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    
+    with get_connection(read_only=True) as conn:
+        cursor = conn.cursor()
         
         # Get data for the last 30 days
-        end_date = date.today()
         start_date = end_date - timedelta(days=30)
+        week_start = end_date - timedelta(days=7)
+        
+        # Daily totals for every category in one round-trip, newest first
+        cursor.execute(
+            """SELECT category, activity_date, SUM(duration_minutes) as total_minutes
+               FROM activities 
+               WHERE user_id = %s AND activity_date >= %s
+               GROUP BY category, activity_date
+               ORDER BY activity_date DESC""",
+            (user_id, start_date)
+        )
+        daily_totals = {category: [] for category in CATEGORY_NAMES}
+        for category, activity_date, total_minutes in cursor.fetchall():
+            if category in daily_totals:
+                daily_totals[category].append((activity_date, int(total_minutes)))
+        
+        # Current streak per category (gaps and islands): numbering distinct days newest
+        # first, every day of a run ending today satisfies date + row_number = tomorrow.
+        # A gap, or any later-dated entry, breaks the run just like a missed day.
+        cursor.execute(
+            """SELECT category, COUNT(*) AS streak FROM (
+                   SELECT category, activity_date,
+                          ROW_NUMBER() OVER (PARTITION BY category ORDER BY activity_date DESC) AS rn
+                   FROM (SELECT DISTINCT category, activity_date FROM activities WHERE user_id = %s) AS days
+               ) AS ranked
+               WHERE DATE_ADD(activity_date, INTERVAL rn DAY) = %s
+               GROUP BY category""",
+            (user_id, end_date + timedelta(days=1))
+        )
+        streaks = dict(cursor.fetchall())
         
         trends = []
         
-        for category in CATEGORIES:
-            # Get monthly average
-            cursor.execute(
-                """SELECT AVG(daily_total) as avg_minutes FROM (
-                    SELECT activity_date, SUM(duration_minutes) as daily_total
-                    FROM activities 
-                    WHERE user_id = %s AND category = %s AND activity_date >= %s
-                    GROUP BY activity_date
-                ) as daily_totals""",
-                (user_id, category, start_date)
-            )
-            avg_result = cursor.fetchone()
-            monthly_avg = round(float(avg_result['avg_minutes']) if avg_result['avg_minutes'] else 0, 1)
-            
-            # Get last 7 days average
-            cursor.execute(
-                """SELECT AVG(daily_total) as avg_minutes FROM (
-                    SELECT activity_date, SUM(duration_minutes) as daily_total
-                    FROM activities 
-                    WHERE user_id = %s AND category = %s AND activity_date >= %s
-                    GROUP BY activity_date
-                ) as daily_totals""",
-                (user_id, category, end_date - timedelta(days=7))
-            )
-            weekly_result = cursor.fetchone()
-            weekly_avg = round(float(weekly_result['avg_minutes']) if weekly_result['avg_minutes'] else 0, 1)
-            
-            # Calculate streak
-            cursor.execute(
-                """SELECT DISTINCT activity_date FROM activities 
-                   WHERE user_id = %s AND category = %s 
-                   ORDER BY activity_date DESC""",
-                (user_id, category)
-            )
-            dates = [row['activity_date'].strftime('%Y-%m-%d') if isinstance(row['activity_date'], date) else row['activity_date'] for row in cursor.fetchall()]
+        for category, days in daily_totals.items():
+            # Averages and data points in a single pass over the days (newest first)
+            monthly_sum = weekly_sum = weekly_count = 0
+            data_points = []
+            for day, minutes in days:
+                monthly_sum += minutes
+                if day >= week_start:
+                    weekly_sum += minutes
+                    weekly_count += 1
+                    data_points.append({"date": day, "minutes": minutes})
             
-            streak = 0
-            current_date = end_date
-            for activity_date in dates:
-                if activity_date == current_date.strftime('%Y-%m-%d'):
-                    streak += 1
-                    current_date -= timedelta(days=1)
-                else:
-                    break
-            
-            # Get daily data points for the last 7 days
-            cursor.execute(
-                """SELECT activity_date, SUM(duration_minutes) as total_minutes
-                   FROM activities 
-                   WHERE user_id = %s AND category = %s AND activity_date >= %s
-                   GROUP BY activity_date
-                   ORDER BY activity_date""",
-                (user_id, category, end_date - timedelta(days=7))
-            )
-            data_points = [
-                {
-                    "date": row['activity_date'].strftime('%Y-%m-%d') if isinstance(row['activity_date'], date) else row['activity_date'], 
-                    "minutes": int(row['total_minutes'])
-                }
-                for row in cursor.fetchall()
-            ]
+            monthly_avg = round(monthly_sum / len(days), 1) if days else 0
+            weekly_avg = round(weekly_sum / weekly_count, 1) if weekly_count else 0
+            data_points.reverse()  # oldest first
             
             trends.append(TrendData(
                 category=category,
                 weekly_average=weekly_avg,
                 monthly_average=monthly_avg,
-                streak_days=streak,
+                streak_days=streaks.get(category, 0),
                 data_points=data_points
             ))
         
-        return {"trends": trends}
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-@app.post("/create-user")
-def create_user(name: str, db: Session = Depends(get_db)):
-    user = User(name=name)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+        content = encode_response({"trends": trends})
+        set_cached_response(user_id, cache_key, content, generation)
+        return Response(content=content, media_type="application/json")
+
+# Other static assets; mounted after every route, since a mount at "/" matches any path
+app.mount("/", StaticFiles(directory="static", html=True), name="static")
+
 # Run the application
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8080))  # Use Railway's assigned port
-    uvicorn.run("main:app", host="0.0.0.0", port=port)
+    uvicorn.run("main:app", host="0.0.0.0", port=port, loop="uvloop", http="httptools")
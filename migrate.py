@@ -0,0 +1,6 @@
+"""Create tables and indexes once, ahead of starting the API workers"""
+from main import init_db
+
+
+if __name__ == "__main__":
+    init_db()